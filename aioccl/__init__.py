@@ -1,5 +1,7 @@
 """aioCCL API wrapper."""
 
 from .device import CCLDevice
+from .filter import CCLHampelFilter, CCLMedianFilter, CCLRangeFilter, CCLSampleFilter
 from .sensor import CCLSensor, CCLSensorTypes
+from .trace import CCLLoggingSink, CCLOpenTelemetrySink, CCLRingSink, CCLTraceSink, CCLTracer
 from .server import CCLServer
@@ -0,0 +1,56 @@
+"""Recording of accepted requests for later replay."""
+
+from __future__ import annotations
+
+from collections.abc import Iterator
+import json
+from pathlib import Path
+import time
+from typing import Any
+
+
+class CCLCapture:
+    """Append accepted requests to an NDJSON file."""
+
+    def __init__(self, path: str | Path):
+        """Open the capture file for appending."""
+        self._file = open(path, "a", encoding="utf-8")  # pylint: disable=consider-using-with
+        self.count = 0
+
+    def record(self, passkey: str, body: bytes, encoding: str = "identity") -> None:
+        """Write one request and flush it to disk.
+
+        The body is stored as the exact bytes received after content
+        decoding; encoding keeps the original Content-Encoding.
+        """
+        self._file.write(
+            json.dumps(
+                {
+                    "time": time.time(),
+                    "passkey": passkey,
+                    "encoding": encoding,
+                    "body": bytes(body).decode("utf-8", "surrogateescape"),
+                },
+                separators=(",", ":"),
+            )
+            + "\n"
+        )
+        self._file.flush()
+        self.count += 1
+
+    def close(self) -> None:
+        """Flush and close the capture file."""
+        self._file.close()
+
+
+def read_capture(path: str | Path) -> Iterator[dict[str, Any]]:
+    """Yield the recorded requests of a capture file in order."""
+    with open(path, encoding="utf-8") as file:
+        for line in file:
+            if line.strip():
+                yield json.loads(line)
+
+
+def capture_body(record: dict[str, Any]) -> bytes:
+    """Return the body bytes of a recorded request."""
+    return record["body"].encode("utf-8", "surrogateescape")
@@ -6,31 +6,31 @@ import logging
 import time
 from typing import Callable, TypedDict
 
-from .exception import CCLDataUpdateException
-from .sensor import CCLSensor
+from .exception import CCLDataUpdateException, CCLSampleRejectedException
+from .filter import CCL_SENSOR_FILTERS, CCLSampleFilter, CCLSampleFilterFactory, apply_filters
+from .sensor import CCL_SENSORS, CCLSensor, CCLSensorTypes
 
 _LOGGER = logging.getLogger(__name__)
 
 CCL_DEVICE_INFO_TYPES = ("serial_no", "mac_address", "model", "fw_ver")
 
 
+class CCLDeviceInfo(TypedDict):
+    """Store device information."""
+    fw_ver: str | None
+    last_update_time: float | None
+    mac_address: str | None
+    model: str | None
+    passkey: str
+    serial_no: str | None
+
+
 class CCLDevice:
     """Mapping for a CCL device."""
 
     def __init__(self, passkey: str):
         """Initialize a CCL device."""
-
-        class Info(TypedDict):
-            """Store device information."""
-            fw_ver: str | None
-            last_update_time: float | None
-            mac_address: str | None
-            model: str | None
-            passkey: str
-            serial_no: str | None
-
-
-        self._info: Info = {
+        self._info: CCLDeviceInfo = {
             "fw_ver": None,
             "last_update_time": None,
             "mac_address": None,
@@ -42,9 +42,15 @@ class CCLDevice:
         self._sensors: dict[str, CCLSensor] = {}
         self._update_callback: Callable[[], None] | None = None
 
-        self._new_sensors: list[CCLSensor] | None = []
+        self._new_sensors: list[CCLSensor] = []
         self._new_sensor_callback: Callable[[], None] | None = None
 
+        self._filter_factories: dict[CCLSensorTypes, CCLSampleFilterFactory] = CCL_SENSOR_FILTERS
+        self._filters: dict[str, list[CCLSampleFilter]] = {}
+        self._rejected_samples: int = 0
+
+        self._info_callback: Callable[[CCLDevice], None] | None = None
+
     @property
     def passkey(self) -> str:
         """Return the passkey."""
@@ -84,6 +90,16 @@ class CCLDevice:
         """Return the firmware version."""
         return self._info["fw_ver"]
 
+    @property
+    def serial_no(self) -> str | None:
+        """Return the serial number."""
+        return self._info["serial_no"]
+
+    @property
+    def rejected_samples(self) -> int:
+        """Return the number of sensor samples rejected by filters."""
+        return self._rejected_samples
+
     def get_sensors(self) -> dict[str, CCLSensor]:
         """Get all types of sensor data under this device."""
         if self._info["last_update_time"] is None:
@@ -100,13 +116,34 @@ class CCLDevice:
         """Set the callback function to add a new sensor."""
         self._new_sensor_callback = callback
 
+    def set_sensor_filters(self, sensor_type: CCLSensorTypes, factory: CCLSampleFilterFactory | None) -> None:
+        """Set the filter factory for a sensor type, or None to disable filtering."""
+        if self._filter_factories is CCL_SENSOR_FILTERS:
+            self._filter_factories = dict(CCL_SENSOR_FILTERS)
+        if factory is None:
+            self._filter_factories.pop(sensor_type, None)
+        else:
+            self._filter_factories[sensor_type] = factory
+        for key in [key for key in self._filters if CCL_SENSORS[key].sensor_type == sensor_type]:
+            del self._filters[key]
+
 
     def update_info(self, new_info: dict[str, None | str]) -> None:
         """Add or update device info."""
+        if self._set_info(new_info) and self._info_callback is not None:
+            self._info_callback(self)
+        self._info["last_update_time"] = time.monotonic()
+
+    def _set_info(self, new_info: dict[str, None | str]) -> bool:
+        """Store device info and tell whether anything changed."""
+        changed = False
         for key, value in new_info.items():
             if key in self._info:
-                self._info[key] = str(value)
-        self._info["last_update_time"] = time.monotonic()
+                value = str(value)
+                if self._info[key] != value:
+                    self._info[key] = value
+                    changed = True
+        return changed
 
     def push_updates(self) -> None:
         """Push sensor updates."""
@@ -125,14 +162,29 @@ class CCLDevice:
         )
         
     def process_data(self, data: dict[str, None | str | int | float]) -> None:
-        """Add or update all sensor values."""
+        """Add or update all sensor values and push the updates."""
+        self.store_data(data)
+        self.push_updates()
+
+    def store_data(self, data: dict[str, None | str | int | float]) -> None:
+        """Add or update all sensor values without pushing updates."""
         for key, value in data.items():
+            if (filters := self._filters.get(key)) is None:
+                factory = self._filter_factories.get(CCL_SENSORS[key].sensor_type)
+                filters = self._filters[key] = factory() if factory is not None else []
+            try:
+                value = apply_filters(filters, value)
+            except CCLSampleRejectedException as err:
+                self._rejected_samples += 1
+                _LOGGER.debug(
+                    "Rejected %s=%s for device %s: %s", key, value, self.device_id, err
+                )
+                continue
             if key not in self._sensors:
                 self._sensors[key] = CCLSensor(key)
                 self._new_sensors.append(self._sensors[key])
             self._sensors[key].last_update_time = time.monotonic()
             self._sensors[key].value = value
-        self.push_updates()
 
     def _publish_updates(self) -> None:
         """Call the function to update sensor data."""
@@ -148,9 +200,12 @@ class CCLDevice:
     def _publish_new_sensors(self) -> bool | None:
         """Schedule all registered callbacks to add new sensors."""
         try:
+            assert self._new_sensors
             assert self._new_sensor_callback is not None
             if self._new_sensor_callback(self._new_sensors) is not True:
                 raise CCLDataUpdateException("Failed to publish new sensor")
         except Exception:  # pylint: disable=broad-exception-caught
             return None
+        # Delivered batches are not kept; a failed batch is retried next time.
+        self._new_sensors = []
         return True
\ No newline at end of file
@@ -4,4 +4,7 @@ class CCLDeviceRegistrationException(Exception):
     """Exception when registering a new device."""
 
 class CCLDataUpdateException(Exception):
-    """Exception when updating data."""
\ No newline at end of file
+    """Exception when updating data."""
+
+class CCLSampleRejectedException(Exception):
+    """Exception when a sensor sample fails validation."""
@@ -0,0 +1,125 @@
+"""CCL sensor sample validation and filtering."""
+
+from __future__ import annotations
+
+from collections import deque
+from math import isfinite
+from statistics import median
+from typing import Callable
+
+from .exception import CCLSampleRejectedException
+from .sensor import CCLSensorTypes
+
+# Scale factor turning a MAD into a standard deviation estimate for normal data.
+_MAD_SCALE = 1.4826
+
+
+class CCLSampleFilter:
+    """Base class for a streaming filter applied to one sensor."""
+
+    def apply(self, value: int | float) -> int | float:
+        """Return the filtered value or raise CCLSampleRejectedException."""
+        return value
+
+
+class CCLRangeFilter(CCLSampleFilter):
+    """Reject samples outside a fixed range."""
+
+    def __init__(self, minimum: float | None = None, maximum: float | None = None):
+        """Initialize a range filter."""
+        self._minimum = minimum
+        self._maximum = maximum
+
+    def apply(self, value: int | float) -> int | float:
+        """Reject the value if it is out of range."""
+        if self._minimum is not None and value < self._minimum:
+            raise CCLSampleRejectedException("Value below minimum")
+        if self._maximum is not None and value > self._maximum:
+            raise CCLSampleRejectedException("Value above maximum")
+        return value
+
+
+class CCLMedianFilter(CCLSampleFilter):
+    """Replace each sample with the median of the last N samples."""
+
+    def __init__(self, window: int = 5):
+        """Initialize a median filter."""
+        self._window: deque[int | float] = deque(maxlen=window)
+
+    def apply(self, value: int | float) -> int | float:
+        """Return the running median."""
+        self._window.append(value)
+        return median(self._window)
+
+
+class CCLHampelFilter(CCLSampleFilter):
+    """Reject samples too far from the median of the last N samples."""
+
+    def __init__(self, window: int = 5, threshold: float = 3.0, min_scale: float = 1.0):
+        """Initialize a Hampel filter.
+
+        min_scale is a floor on the spread in sensor units, so a flat window
+        does not turn every small change into an outlier. The median lags a
+        trend by about half the window, so after a flat window a ramp of more
+        than threshold * min_scale / (window // 2 + 1) units per sample is
+        rejected until it dominates. The defaults follow a ramp of 1 unit per
+        sample; raise min_scale for sensors that move faster between reports.
+        """
+        self._window: deque[int | float] = deque(maxlen=window)
+        self._threshold = threshold
+        self._min_scale = min_scale
+
+    def apply(self, value: int | float) -> int | float:
+        """Reject the value if it is an outlier."""
+        window = self._window
+        full = len(window) == window.maxlen
+        if full:
+            center = median(window)
+            scale = max(
+                _MAD_SCALE * median(abs(sample - center) for sample in window),
+                self._min_scale,
+            )
+        # Rejected samples still enter the window so a genuine step change is
+        # accepted once it dominates.
+        window.append(value)
+        if full and abs(value - center) > self._threshold * scale:
+            raise CCLSampleRejectedException("Value is an outlier")
+        return value
+
+
+CCLSampleFilterFactory = Callable[[], list[CCLSampleFilter]]
+
+CCL_SENSOR_FILTERS: dict[CCLSensorTypes, CCLSampleFilterFactory] = {
+    CCLSensorTypes.TEMPERATURE: lambda: [CCLRangeFilter(-90, 90)],
+    CCLSensorTypes.HUMIDITY: lambda: [CCLRangeFilter(0, 100)],
+    CCLSensorTypes.WIND_DIRECTION: lambda: [CCLRangeFilter(0, 360)],
+    CCLSensorTypes.WIND_SPEED: lambda: [CCLRangeFilter(0)],
+    CCLSensorTypes.RAIN_RATE: lambda: [CCLRangeFilter(0)],
+    CCLSensorTypes.RAINFALL: lambda: [CCLRangeFilter(0)],
+    CCLSensorTypes.UVI: lambda: [CCLRangeFilter(0)],
+    CCLSensorTypes.RADIATION: lambda: [CCLRangeFilter(0)],
+    CCLSensorTypes.CO: lambda: [CCLRangeFilter(0)],
+    CCLSensorTypes.CO2: lambda: [CCLRangeFilter(0)],
+    CCLSensorTypes.PM10: lambda: [CCLRangeFilter(0)],
+    CCLSensorTypes.PM25: lambda: [CCLRangeFilter(0)],
+}
+
+
+def apply_filters(filters: list[CCLSampleFilter], value: None | str | int | float) -> None | str | int | float:
+    """Run a sample through a filter chain.
+
+    Numeric strings are converted to float first; anything else that is
+    not a finite number is rejected. Without filters the value is kept.
+    """
+    if not filters or value is None:
+        return value
+    if isinstance(value, str):
+        try:
+            value = float(value)
+        except ValueError as err:
+            raise CCLSampleRejectedException("Value is not numeric") from err
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not isfinite(value):
+        raise CCLSampleRejectedException("Value is not numeric")
+    for sample_filter in filters:
+        value = sample_filter.apply(value)
+    return value
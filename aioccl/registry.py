@@ -0,0 +1,266 @@
+"""CCL device registry and secondary indexes."""
+
+from __future__ import annotations
+
+from collections.abc import Iterable
+import dbm
+import json
+import logging
+from pathlib import Path
+import sys
+import time
+
+from .device import CCL_DEVICE_INFO_TYPES, CCLDevice
+from .exception import CCLDeviceRegistrationException
+
+_LOGGER = logging.getLogger(__name__)
+
+CCL_DEVICE_INDEX_TYPES = ("device_id", "mac_address", "model", "serial_no")
+
+
+class CCLDeviceIndex:
+    """Secondary indexes over the info fields of registered devices.
+
+    A value held by one device maps straight to that device; only values
+    shared by several devices, such as a model, map to a dict by passkey.
+    """
+
+    def __init__(self):
+        """Initialize empty indexes."""
+        self._indexes: dict[str, dict[str, CCLDevice | dict[str, CCLDevice]]] = {
+            field: {} for field in CCL_DEVICE_INDEX_TYPES
+        }
+        self._keys: dict[str, tuple[str | None, ...]] = {}
+
+    def add(self, device: CCLDevice) -> None:
+        """Index a device and follow its info updates."""
+        self.add_many((device,))
+
+    def add_many(self, devices: Iterable[CCLDevice]) -> None:
+        """Index several devices and follow their info updates."""
+        indexes = [self._indexes[field] for field in CCL_DEVICE_INDEX_TYPES]
+        keys = self._keys
+        refresh = self.refresh
+        for device in devices:
+            values = _index_values(device)
+            keys[device.passkey] = values
+            device._info_callback = refresh  # pylint: disable=protected-access
+            for index, value in zip(indexes, values):
+                if value is not None:
+                    _insert(index, value, device)
+
+    def remove(self, device: CCLDevice) -> None:
+        """Drop a device from all indexes."""
+        values = self._keys.pop(device.passkey, None)
+        if values is None:
+            return
+        device._info_callback = None  # pylint: disable=protected-access
+        for field, value in zip(CCL_DEVICE_INDEX_TYPES, values):
+            if value is not None:
+                self._discard(field, value, device.passkey)
+
+    def refresh(self, device: CCLDevice) -> None:
+        """Bring the index entries of a device in line with its info."""
+        passkey = device.passkey
+        old_values = self._keys.get(passkey)
+        if old_values is None:
+            return
+        values = _index_values(device)
+        if values == old_values:
+            return
+        self._keys[passkey] = values
+        for field, old_value, value in zip(CCL_DEVICE_INDEX_TYPES, old_values, values):
+            if value == old_value:
+                continue
+            if old_value is not None:
+                self._discard(field, old_value, passkey)
+            if value is not None:
+                _insert(self._indexes[field], value, device)
+
+    def find(self, field: str, value: str) -> list[CCLDevice]:
+        """Return all devices whose info field equals the value."""
+        if field not in self._indexes:
+            raise KeyError(field)
+        bucket = self._indexes[field].get(value)
+        if bucket is None:
+            return []
+        if isinstance(bucket, dict):
+            return list(bucket.values())
+        return [bucket]
+
+    def clear(self) -> None:
+        """Drop all devices from the indexes."""
+        for index in self._indexes.values():
+            for bucket in index.values():
+                for device in bucket.values() if isinstance(bucket, dict) else (bucket,):
+                    device._info_callback = None  # pylint: disable=protected-access
+            index.clear()
+        self._keys.clear()
+
+    def _discard(self, field: str, value: str, passkey: str) -> None:
+        """Remove one entry from an index."""
+        index = self._indexes[field]
+        bucket = index.get(value)
+        if bucket is None:
+            return
+        if isinstance(bucket, dict):
+            bucket.pop(passkey, None)
+            if len(bucket) == 1:
+                index[value] = next(iter(bucket.values()))
+            elif not bucket:
+                del index[value]
+        elif bucket.passkey == passkey:
+            del index[value]
+
+
+def _index_values(device: CCLDevice) -> tuple[str | None, ...]:
+    """Return the indexed info values of a device, in CCL_DEVICE_INDEX_TYPES order."""
+    info = device._info  # pylint: disable=protected-access
+    return (device.device_id, info["mac_address"], info["model"], info["serial_no"])
+
+
+def _insert(index: dict[str, CCLDevice | dict[str, CCLDevice]], value: str, device: CCLDevice) -> None:
+    """Add one entry to an index."""
+    bucket = index.get(value)
+    if bucket is None:
+        index[value] = device
+    elif isinstance(bucket, dict):
+        bucket[device.passkey] = device
+    elif bucket is not device:
+        index[value] = {bucket.passkey: bucket, device.passkey: device}
+
+
+def register_many(devices: dict[str, CCLDevice], new_devices: Iterable[CCLDevice]) -> list[CCLDevice]:
+    """Validate and register devices in one pass, all or nothing."""
+    batch: dict[str, CCLDevice] = {}
+    for device in new_devices:
+        if not isinstance(device, CCLDevice):
+            raise CCLDeviceRegistrationException("Invalid device")
+        if device.passkey in devices or device.passkey in batch:
+            raise CCLDeviceRegistrationException("Device already exists")
+        batch[device.passkey] = device
+    devices.update(batch)
+    _LOGGER.debug("Devices registered: %s", len(batch))
+    return list(batch.values())
+
+
+def unregister_many(devices: dict[str, CCLDevice], passkeys: Iterable[str]) -> list[CCLDevice]:
+    """Unregister devices by passkey, ignoring unknown ones."""
+    removed: list[CCLDevice] = []
+    for passkey in passkeys:
+        device = devices.pop(passkey, None)
+        if device is not None:
+            removed.append(device)
+    _LOGGER.debug("Devices unregistered: %s", len(removed))
+    return removed
+
+
+def load_devices(path: str | Path) -> list[CCLDevice]:
+    """Read devices from a JSON file.
+
+    The file holds a list whose entries are either a passkey or an object
+    with a passkey and optional device info fields.
+    """
+    with open(path, encoding="utf-8") as file:
+        entries = json.load(file)
+    if not isinstance(entries, list):
+        raise CCLDeviceRegistrationException("Invalid device file")
+    loaded: list[CCLDevice] = []
+    for entry in entries:
+        if isinstance(entry, str):
+            entry = {"passkey": entry}
+        if not isinstance(entry, dict) or not isinstance(entry.get("passkey"), str):
+            raise CCLDeviceRegistrationException("Invalid device entry")
+        device = CCLDevice(entry["passkey"])
+        device._set_info(  # pylint: disable=protected-access
+            {key: value for key, value in entry.items() if key in CCL_DEVICE_INFO_TYPES}
+        )
+        loaded.append(device)
+    return loaded
+
+
+def select_idle(devices: dict[str, CCLDevice], max_idle_time: float) -> list[str]:
+    """Return passkeys of devices that have not reported for too long.
+
+    Devices that never reported are left alone.
+    """
+    deadline = time.monotonic() - max_idle_time
+    return [
+        passkey
+        for passkey, device in devices.items()
+        if device.last_update_time is not None and device.last_update_time < deadline
+    ]
+
+
+def select_overflow(devices: dict[str, CCLDevice], max_devices: int) -> list[str]:
+    """Return passkeys of the least recently updated devices above a cap.
+
+    Devices that never reported are left alone, as in select_idle.
+    """
+    overflow = len(devices) - max_devices
+    if overflow <= 0:
+        return []
+    ranked = sorted(
+        (
+            (device.last_update_time, passkey)
+            for passkey, device in devices.items()
+            if device.last_update_time is not None
+        ),
+    )
+    return [passkey for _, passkey in ranked[:overflow]]
+
+
+def estimate_size(device: CCLDevice) -> int:
+    """Estimate the memory held by a device in bytes."""
+    # pylint: disable=protected-access
+    size = sys.getsizeof(device) + sys.getsizeof(device.__dict__)
+    size += sys.getsizeof(device._info) + sys.getsizeof(device._sensors)
+    size += sys.getsizeof(device._new_sensors) + sys.getsizeof(device._filters)
+    size += sum(sys.getsizeof(sensor) for sensor in device._sensors.values())
+    size += sum(sys.getsizeof(filters) for filters in device._filters.values())
+    return size
+
+
+class CCLDeviceSpill:
+    """On-disk store for evicted devices, keyed by passkey."""
+
+    def __init__(self, path: str | Path):
+        """Open or create the store."""
+        self._db = dbm.open(str(path), "c")
+
+    def __len__(self) -> int:
+        """Return the number of spilled devices."""
+        return len(self._db)
+
+    def __contains__(self, passkey: str) -> bool:
+        """Tell whether a device is spilled."""
+        return passkey in self._db
+
+    def put(self, device: CCLDevice) -> None:
+        """Write the info of a device to disk."""
+        info = {key: getattr(device, key) for key in CCL_DEVICE_INFO_TYPES}
+        self._db[device.passkey] = json.dumps(info)
+
+    def discard(self, passkey: str) -> None:
+        """Drop a device from the store if it is there."""
+        try:
+            del self._db[passkey]
+        except KeyError:
+            pass
+
+    def pop(self, passkey: str) -> CCLDevice | None:
+        """Read a device back from disk and drop it from the store."""
+        try:
+            info = json.loads(self._db[passkey])
+        except KeyError:
+            return None
+        del self._db[passkey]
+        device = CCLDevice(passkey)
+        device._set_info(  # pylint: disable=protected-access
+            {key: value for key, value in info.items() if value is not None}
+        )
+        return device
+
+    def close(self) -> None:
+        """Close the store."""
+        self._db.close()
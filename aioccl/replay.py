@@ -0,0 +1,158 @@
+"""Replay of captured requests.
+
+Run as ``python -m aioccl.replay capture.ndjson`` to push a capture
+through the device processing core, or add ``--url`` to send it to a
+running server over HTTP.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+from dataclasses import dataclass, field
+import gzip
+import json
+from pathlib import Path
+import time
+from typing import Any
+import zlib
+
+from aiohttp import ClientSession
+
+from .capture import capture_body, read_capture
+from .device import CCLDevice
+from .server import split_body
+
+
+@dataclass
+class CCLReplayStats:
+    """Outcome of a replay run."""
+
+    requests: int = 0
+    errors: int = 0
+    elapsed: float = 0.0
+    latencies: list[float] = field(default_factory=list)
+
+    @property
+    def throughput(self) -> float:
+        """Return requests per second."""
+        return self.requests / self.elapsed if self.elapsed > 0 else 0.0
+
+    def percentile(self, fraction: float) -> float:
+        """Return a latency percentile in seconds."""
+        if not self.latencies:
+            return 0.0
+        ordered = sorted(self.latencies)
+        return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)]
+
+    def summary(self) -> str:
+        """Return a one-line report."""
+        return (
+            f"{self.requests} requests, {self.errors} errors in {self.elapsed:.3f} s "
+            f"({self.throughput:.0f} req/s); latency p50={self.percentile(0.5) * 1e3:.3f} ms "
+            f"p95={self.percentile(0.95) * 1e3:.3f} ms p99={self.percentile(0.99) * 1e3:.3f} ms"
+        )
+
+
+async def _pace(record: dict[str, Any], origin: list[float]) -> None:
+    """Sleep until the recorded offset of a request has passed."""
+    if not origin:
+        origin.extend((record["time"], time.perf_counter()))
+        return
+    delay = record["time"] - origin[0] - (time.perf_counter() - origin[1])
+    if delay > 0:
+        await asyncio.sleep(delay)
+
+
+async def replay_direct(path: str | Path, paced: bool = False) -> CCLReplayStats:
+    """Feed a capture straight into fresh CCLDevice objects."""
+    devices: dict[str, CCLDevice] = {}
+    stats = CCLReplayStats()
+    origin: list[float] = []
+    start = time.perf_counter()
+    for record in read_capture(path):
+        if paced:
+            await _pace(record, origin)
+        began = time.perf_counter()
+        device = devices.get(record["passkey"])
+        if device is None:
+            device = devices[record["passkey"]] = CCLDevice(record["passkey"])
+            device.set_update_callback(lambda sensors: None)
+            device.set_new_sensor_callback(lambda sensors: True)
+        try:
+            info, data = split_body(json.loads(capture_body(record)))
+            device.update_info(info)
+            device.process_data(data)
+        except Exception:  # pylint: disable=broad-exception-caught
+            stats.errors += 1
+        stats.latencies.append(time.perf_counter() - began)
+        stats.requests += 1
+    stats.elapsed = time.perf_counter() - start
+    return stats
+
+
+async def replay_http(path: str | Path, url: str, paced: bool = False, concurrency: int = 1) -> CCLReplayStats:
+    """Send a capture to a running server."""
+    stats = CCLReplayStats()
+    origin: list[float] = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def send(session: ClientSession, record: dict[str, Any]) -> None:
+        try:
+            began = time.perf_counter()
+            body = capture_body(record)
+            headers = {"Content-Type": "application/json"}
+            encoding = record.get("encoding", "identity")
+            if encoding == "gzip":
+                body = gzip.compress(body)
+            elif encoding == "deflate":
+                body = zlib.compress(body)
+            if encoding != "identity":
+                headers["Content-Encoding"] = encoding
+            async with session.get(
+                f"{url.rstrip('/')}/{record['passkey']}", data=body, headers=headers
+            ) as response:
+                await response.read()
+                if response.status != 200:
+                    stats.errors += 1
+            stats.latencies.append(time.perf_counter() - began)
+        except Exception:  # pylint: disable=broad-exception-caught
+            stats.errors += 1
+        finally:
+            semaphore.release()
+        stats.requests += 1
+
+    async with ClientSession() as session:
+        tasks: set[asyncio.Task] = set()
+        start = time.perf_counter()
+        for record in read_capture(path):
+            if paced:
+                await _pace(record, origin)
+            await semaphore.acquire()
+            task = asyncio.create_task(send(session, record))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        if tasks:
+            await asyncio.gather(*tasks)
+        stats.elapsed = time.perf_counter() - start
+    return stats
+
+
+def main() -> None:
+    """Replay a capture from the command line."""
+    parser = argparse.ArgumentParser(description="Replay captured CCL requests.")
+    parser.add_argument("capture", help="NDJSON capture file")
+    parser.add_argument("--url", help="send to a server at this URL instead of in process")
+    parser.add_argument("--paced", action="store_true", help="keep the original timing")
+    parser.add_argument("--concurrency", type=int, default=1, help="requests in flight over HTTP")
+    args = parser.parse_args()
+
+    if args.url is None:
+        stats = asyncio.run(replay_direct(args.capture, args.paced))
+    else:
+        stats = asyncio.run(replay_http(args.capture, args.url, args.paced, args.concurrency))
+    print(stats.summary())
+
+
+if __name__ == "__main__":
+    main()
@@ -9,6 +9,8 @@ from typing import Any
 class CCLSensor:
     """Class that represents a CCLSensor object in the aioCCL API."""
 
+    __slots__ = ("_key", "_last_update_time", "_value")
+
     def __init__(self, key: str):
         """Initialize a CCL sensor."""
         self._last_update_time: float | None = None
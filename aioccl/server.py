@@ -2,14 +2,40 @@
 
 from __future__ import annotations
 
+import asyncio
+from collections.abc import Iterable
 from http import HTTPStatus
+import json
 import logging
+from pathlib import Path
+from typing import Callable
+import zlib
 
 from aiohttp import web
 
 from .device import CCLDevice, CCL_DEVICE_INFO_TYPES
 from .exception import CCLDeviceRegistrationException
+from .capture import CCLCapture
+from .registry import (
+    CCLDeviceIndex,
+    CCLDeviceSpill,
+    estimate_size,
+    load_devices,
+    register_many,
+    select_idle,
+    select_overflow,
+    unregister_many,
+)
 from .sensor import CCL_SENSORS
+from .snapshot import (
+    CCLDeviceState,
+    apply_snapshot,
+    capture_snapshot,
+    read_snapshot,
+    restore_state,
+    write_snapshot,
+)
+from .trace import CCLTrace, CCLTracer
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -20,21 +46,282 @@ def register(devices: dict[str, CCLDevice], device: CCLDevice) -> None:
     devices[device.passkey] = device
     _LOGGER.debug("Device registered: %s", device.passkey)
 
+async def read_body(request: web.BaseRequest | web.Request, max_content_length: int, max_body_size: int) -> bytearray:
+    """Read a request body, decompressing gzip or deflate as it streams in."""
+    # Limits are enforced with explicit raises so they survive python -O.
+    encoding = request.headers.get("Content-Encoding", "identity").lower()
+    if encoding not in ("identity", "gzip", "deflate"):
+        raise ValueError(HTTPStatus.UNSUPPORTED_MEDIA_TYPE)
+    if request.content_length is not None and request.content_length > max_content_length:
+        raise ValueError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE)
+
+    body = bytearray()
+    received = 0
+    decompressor = None
+    try:
+        async for chunk in request.content.iter_chunked(8192):
+            received += len(chunk)
+            if received > max_content_length:
+                raise ValueError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE)
+            if encoding == "identity":
+                body += chunk
+                continue
+            if decompressor is None:
+                if encoding == "gzip":
+                    wbits = 16 + zlib.MAX_WBITS
+                elif chunk[0] & 0x0F == 8:
+                    wbits = zlib.MAX_WBITS
+                else:
+                    # Some clients send raw deflate without the zlib header.
+                    wbits = -zlib.MAX_WBITS
+                decompressor = zlib.decompressobj(wbits)
+            # Ask for one byte over the limit so an oversized body is detected
+            # without inflating the rest of it.
+            body += decompressor.decompress(chunk, max_body_size + 1 - len(body))
+            if len(body) > max_body_size:
+                raise ValueError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE)
+        if decompressor is not None:
+            body += decompressor.flush()
+            if not decompressor.eof:
+                raise ValueError(HTTPStatus.BAD_REQUEST)
+    except zlib.error as err:
+        raise ValueError(HTTPStatus.BAD_REQUEST) from err
+    if len(body) > max_body_size:
+        raise ValueError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE)
+    if not body:
+        raise ValueError(HTTPStatus.BAD_REQUEST)
+    return body
+
+def split_body(body: dict[str, None | str | int | float]) -> tuple[dict[str, None | str], dict[str, None | str | int | float]]:
+    """Split a request body into device info and sensor data."""
+    data: dict[str, None | str | int | float] = {}
+    info: dict[str, None | str] = {}
+    for key, value in body.items():
+        if key in CCL_DEVICE_INFO_TYPES:
+            info.setdefault(key, value)
+        elif key in CCL_SENSORS:
+            data.setdefault(key, value)
+    return info, data
+
 class CCLServer:
     """Represent a CCL server manager."""
 
     LISTEN_PORT = 42373
+    HOUSEKEEPING_INTERVAL = 60
+
+    max_content_length: int = 65536
+    max_body_size: int = 262144
 
     devices: dict[str, CCLDevice] = {}
+    index: CCLDeviceIndex = CCLDeviceIndex()
+
+    max_idle_time: float | None = None
+    max_devices: int | None = None
+    spill: CCLDeviceSpill | None = None
+    evicted_count: int = 0
+    _evict_callback: Callable[[list[CCLDevice]], None] | None = None
+    _restore_callback: Callable[[CCLDevice], None] | None = None
+    _housekeeping_task: asyncio.Task | None = None
+    tracer: CCLTracer | None = None
+    snapshot_path: str | Path | None = None
+    _snapshot_lock: asyncio.Lock = asyncio.Lock()
+    _pending_states: dict[str, CCLDeviceState] = {}
+    capture: CCLCapture | None = None
 
     @staticmethod
     def register(device: CCLDevice) -> None:
         """Register a device with a passkey."""
         register(CCLServer.devices, device)
+        CCLServer._claim_state(device)
+        CCLServer.index.add(device)
+
+    @staticmethod
+    def register_many(devices: Iterable[CCLDevice]) -> None:
+        """Register several devices at once, all or nothing."""
+        registered = register_many(CCLServer.devices, devices)
+        if CCLServer._pending_states:
+            for device in registered:
+                CCLServer._claim_state(device)
+        CCLServer.index.add_many(registered)
+
+    @staticmethod
+    def _claim_state(device: CCLDevice) -> None:
+        """Merge snapshot state waiting for a newly registered device."""
+        if CCLServer._pending_states:
+            state = CCLServer._pending_states.pop(device.passkey, None)
+            if state is not None:
+                restore_state(device, state)
+
+    @staticmethod
+    def register_file(path: str | Path) -> None:
+        """Register all devices listed in a JSON file."""
+        CCLServer.register_many(load_devices(path))
+
+    @staticmethod
+    def unregister(passkey: str) -> None:
+        """Unregister a device by passkey."""
+        CCLServer.unregister_many((passkey,))
+
+    @staticmethod
+    def unregister_file(path: str | Path) -> None:
+        """Unregister all devices listed in a JSON file."""
+        CCLServer.unregister_many(device.passkey for device in load_devices(path))
+
+    @staticmethod
+    def unregister_many(passkeys: Iterable[str]) -> None:
+        """Unregister several devices by passkey, including spilled ones."""
+        passkeys = list(passkeys)
+        for passkey in passkeys:
+            CCLServer._pending_states.pop(passkey, None)
+            if CCLServer.spill is not None:
+                CCLServer.spill.discard(passkey)
+        for device in unregister_many(CCLServer.devices, passkeys):
+            CCLServer.index.remove(device)
+
+    @staticmethod
+    def find_devices(field: str, value: str) -> list[CCLDevice]:
+        """Find devices by device_id, mac_address, model or serial_no."""
+        return CCLServer.index.find(field, value)
+
+    @staticmethod
+    def set_tracer(tracer: CCLTracer | None) -> None:
+        """Set the request tracer, or None to turn tracing off."""
+        CCLServer.tracer = tracer
+
+    @staticmethod
+    def set_capture(capture: CCLCapture | None) -> None:
+        """Set where accepted requests are recorded, or None to stop recording."""
+        if CCLServer.capture is not None:
+            CCLServer.capture.close()
+        CCLServer.capture = capture
+
+    @staticmethod
+    def enable_spill(path: str | Path) -> None:
+        """Keep evicted devices on disk and restore them when they report again."""
+        if CCLServer.spill is not None:
+            CCLServer.spill.close()
+        CCLServer.spill = CCLDeviceSpill(path)
+
+    @staticmethod
+    def set_evict_callback(callback: Callable[[list[CCLDevice]], None]) -> None:
+        """Set the callback function called with evicted devices."""
+        CCLServer._evict_callback = callback
 
     @staticmethod
-    async def handler(request: web.BaseRequest | web.Request, devices: dict[str, CCLDevice]) -> web.Response:
+    def set_restore_callback(callback: Callable[[CCLDevice], None]) -> None:
+        """Set the callback function called when a spilled device is restored."""
+        CCLServer._restore_callback = callback
+
+    @staticmethod
+    def evict() -> list[CCLDevice]:
+        """Evict idle devices and devices above the configured cap."""
+        evicted: list[CCLDevice] = []
+        if CCLServer.max_idle_time is not None:
+            evicted += unregister_many(
+                CCLServer.devices, select_idle(CCLServer.devices, CCLServer.max_idle_time)
+            )
+        if CCLServer.max_devices is not None:
+            evicted += unregister_many(
+                CCLServer.devices, select_overflow(CCLServer.devices, CCLServer.max_devices)
+            )
+        for device in evicted:
+            CCLServer.index.remove(device)
+            if CCLServer.spill is not None:
+                CCLServer.spill.put(device)
+        CCLServer.evicted_count += len(evicted)
+        if evicted and CCLServer._evict_callback is not None:
+            try:
+                CCLServer._evict_callback(evicted)
+            except Exception as err:  # pylint: disable=broad-exception-caught
+                _LOGGER.warning("Error while evicting devices: %s", err)
+        return evicted
+
+    @staticmethod
+    def restore(passkey: str) -> CCLDevice | None:
+        """Bring a spilled device back into the registry."""
+        if CCLServer.spill is None:
+            return None
+        device = CCLServer.spill.pop(passkey)
+        if device is None:
+            return None
+        CCLServer.register(device)
+        if CCLServer._restore_callback is not None:
+            try:
+                CCLServer._restore_callback(device)
+            except Exception as err:  # pylint: disable=broad-exception-caught
+                _LOGGER.warning("Error while restoring device %s: %s", passkey, err)
+        return device
+
+    @staticmethod
+    def memory_stats() -> dict[str, int]:
+        """Return memory usage figures for the registry."""
+        devices = CCLServer.devices.values()
+        # pylint: disable=protected-access
+        return {
+            "devices": len(CCLServer.devices),
+            "sensors": sum(len(device._sensors) for device in devices),
+            "pending_new_sensors": sum(len(device._new_sensors) for device in devices),
+            "spilled_devices": 0 if CCLServer.spill is None else len(CCLServer.spill),
+            "evicted_devices": CCLServer.evicted_count,
+            "estimated_bytes": sum(estimate_size(device) for device in devices),
+        }
+
+    @staticmethod
+    async def save_snapshot() -> None:
+        """Write the registry and sensor state to snapshot_path."""
+        if CCLServer.snapshot_path is None:
+            return
+        async with CCLServer._snapshot_lock:
+            snapshot = capture_snapshot(CCLServer.devices, CCLServer._pending_states)
+            write = asyncio.ensure_future(
+                asyncio.to_thread(write_snapshot, snapshot, CCLServer.snapshot_path)
+            )
+            try:
+                await asyncio.shield(write)
+            except asyncio.CancelledError:
+                # The thread cannot be stopped; hold the lock until it is done.
+                await write
+                raise
+        _LOGGER.debug("Saved snapshot of %s devices.", len(snapshot["devices"]))
+
+    @staticmethod
+    def load_snapshot() -> None:
+        """Restore the registry and sensor state from snapshot_path."""
+        if CCLServer.snapshot_path is None:
+            return
+        snapshot = read_snapshot(CCLServer.snapshot_path)
+        if snapshot is None:
+            return
+        # State for passkeys that are not registered yet waits until they are.
+        try:
+            CCLServer._pending_states = apply_snapshot(CCLServer.devices, snapshot)
+        except Exception as err:  # pylint: disable=broad-exception-caught
+            _LOGGER.warning("Failed to load snapshot: %s", err)
+            return
+        _LOGGER.debug("Loaded snapshot of %s devices.", len(snapshot["devices"]))
+
+    @staticmethod
+    async def _housekeeping() -> None:
+        """Run periodic maintenance while the server is up."""
+        while True:
+            await asyncio.sleep(CCLServer.HOUSEKEEPING_INTERVAL)
+            try:
+                evicted = CCLServer.evict()
+            except Exception as err:  # pylint: disable=broad-exception-caught
+                _LOGGER.warning("Failed to evict devices: %s", err)
+            else:
+                if evicted:
+                    _LOGGER.debug("Evicted devices: %s", len(evicted))
+            try:
+                await CCLServer.save_snapshot()
+            except Exception as err:  # pylint: disable=broad-exception-caught
+                _LOGGER.warning("Failed to save snapshot: %s", err)
+
+    @staticmethod
+    async def handler(request: web.BaseRequest | web.Request, devices: dict[str, CCLDevice] | None = None) -> web.Response:
         """Handle POST requests for data updating."""
+        if devices is None:
+            devices = CCLServer.devices
         body: dict[str, None | str | int | float] = {}
         data: dict[str, None | str | int | float] = {}
         device: CCLDevice = None
@@ -42,58 +329,114 @@ class CCLServer:
         passkey: str = ""
         status: None | int = None
         text: None | str = None
+        trace: CCLTrace | None = None
+        tracer = CCLServer.tracer
 
         _LOGGER.debug("Request received: %s", passkey)
+        passkey = request.path[-64:]
+        if tracer is not None:
+            trace = tracer.start(passkey)
         try:
-            passkey = request.path[-64:]
-            for ref_passkey, ref_device in devices.items():
-                if passkey == ref_passkey:
-                    device = ref_device
-                    break
-            assert isinstance(device, CCLDevice), HTTPStatus.NOT_FOUND
+            try:
+                device = devices.get(passkey)
+                # Spilled devices are only restored once the request is valid.
+                if device is None and (CCLServer.spill is None or passkey not in CCLServer.spill):
+                    raise ValueError(HTTPStatus.NOT_FOUND)
 
-            assert request.content_type == "application/json", HTTPStatus.BAD_REQUEST
-            assert 0 < request.content_length <= 5000, HTTPStatus.BAD_REQUEST
+                if request.content_type != "application/json":
+                    raise ValueError(HTTPStatus.BAD_REQUEST)
+                if trace is not None:
+                    trace.mark("lookup")
 
-            body = await request.json()
+                raw = await read_body(request, CCLServer.max_content_length, CCLServer.max_body_size)
+                if trace is not None:
+                    trace.mark("read")
+                try:
+                    body = json.loads(raw)
+                except ValueError as err:
+                    raise ValueError(HTTPStatus.BAD_REQUEST) from err
+                if not isinstance(body, dict):
+                    raise ValueError(HTTPStatus.BAD_REQUEST)
+                if device is None:
+                    device = CCLServer.restore(passkey)
+                    if device is None:
+                        raise ValueError(HTTPStatus.NOT_FOUND)
+                if trace is not None:
+                    trace.device_id = device.device_id
+                    trace.mark("decode")
 
-        except Exception as err:  # pylint: disable=broad-exception-caught
-            status = err.args[0]
-            if status == HTTPStatus.BAD_REQUEST:
-                text = "400 Bad Request."
-            elif status == HTTPStatus.NOT_FOUND:
-                text = "404 Not Found."
-            else:
+            except Exception as err:  # pylint: disable=broad-exception-caught
+                status = err.args[0] if err.args else None
+                if status == HTTPStatus.BAD_REQUEST:
+                    text = "400 Bad Request."
+                elif status == HTTPStatus.NOT_FOUND:
+                    text = "404 Not Found."
+                elif status == HTTPStatus.REQUEST_ENTITY_TOO_LARGE:
+                    text = "413 Payload Too Large."
+                elif status == HTTPStatus.UNSUPPORTED_MEDIA_TYPE:
+                    text = "415 Unsupported Media Type."
+                else:
+                    status = HTTPStatus.INTERNAL_SERVER_ERROR
+                    text = "500 Internal Server Error."
+                _LOGGER.debug("Request exception occured: %s", err)
+                return web.Response(status=status, text=text)
+
+            try:
+                info, data = split_body(body)
+                if trace is not None:
+                    trace.mark("route")
+
+                device.update_info(info)
+                if trace is not None:
+                    trace.mark("update_info")
+                device.store_data(data)
+                if trace is not None:
+                    trace.mark("process_data")
+                device.push_updates()
+                if trace is not None:
+                    trace.mark("callbacks")
+
+            except Exception as err:  # pylint: disable=broad-exception-caught
                 status = HTTPStatus.INTERNAL_SERVER_ERROR
                 text = "500 Internal Server Error."
-            _LOGGER.debug("Request exception occured: %s", err)
-            return web.Response(status=status, text=text)
+                _LOGGER.warning(
+                    "Error while processing data for device %s: %s", device.device_id, err
+                )
+                return web.Response(status=status, text=text)
 
-        for key, value in body.items():
-            if key in CCL_DEVICE_INFO_TYPES:
-                info.setdefault(key, value)
-            elif key in CCL_SENSORS:
-                data.setdefault(key, value)
+            if CCLServer.capture is not None:
+                try:
+                    CCLServer.capture.record(
+                        passkey, raw, request.headers.get("Content-Encoding", "identity").lower()
+                    )
+                except Exception as err:  # pylint: disable=broad-exception-caught
+                    _LOGGER.warning("Failed to capture request: %s", err)
+            status = HTTPStatus.OK
+            text = "200 OK"
+            _LOGGER.debug("Request processed: %s", passkey)
+            return web.Response(status=status, text=text)
 
-        device.update_info(info)
-        device.process_data(data)
-        status = HTTPStatus.OK
-        text = "200 OK"
-        _LOGGER.debug("Request processed: %s", passkey)
-        return web.Response(status=status, text=text)
+        finally:
+            if trace is not None:
+                if status != HTTPStatus.OK:
+                    trace.mark("error")
+                tracer.finish(trace, status)
 
     app = web.Application()
     app.add_routes([web.get("/{passkey}", handler)])
-    runner = web.AppRunner(app)
+    # Bodies are decompressed by read_body so the size cap applies while inflating.
+    runner = web.AppRunner(app, auto_decompress=False)
 
     @staticmethod
     async def run() -> None:
         """Try to run the API server."""
         try:
             _LOGGER.debug("Trying to start the API server.")
+            CCLServer.load_snapshot()
             await CCLServer.runner.setup()
             site = web.TCPSite(CCLServer.runner, port=CCLServer.LISTEN_PORT)
             await site.start()
+            CCLServer._housekeeping_task = asyncio.create_task(CCLServer._housekeeping())
         except Exception as err:  # pylint: disable=broad-exception-caught
             _LOGGER.warning("Failed to run the API server: %s", err)
         else:
@@ -102,4 +445,21 @@ class CCLServer:
     @staticmethod
     async def stop() -> None:
         """Stop running the API server."""
+        if CCLServer._housekeeping_task is not None:
+            CCLServer._housekeeping_task.cancel()
+            # A snapshot write already in progress keeps the lock until its
+            # thread finishes, so the final save below cannot overlap it.
+            try:
+                await CCLServer._housekeeping_task
+            except asyncio.CancelledError:
+                pass
+            CCLServer._housekeeping_task = None
         await CCLServer.runner.cleanup()
+        try:
+            await CCLServer.save_snapshot()
+        except Exception as err:  # pylint: disable=broad-exception-caught
+            _LOGGER.warning("Failed to save snapshot: %s", err)
+        if CCLServer.spill is not None:
+            CCLServer.spill.close()
+            CCLServer.spill = None
+        CCLServer.set_capture(None)
@@ -0,0 +1,180 @@
+"""Snapshots of the device registry for warm restarts."""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+from pathlib import Path
+import tempfile
+import time
+from typing import Any
+import zlib
+
+from .device import CCL_DEVICE_INFO_TYPES, CCLDevice
+from .sensor import CCL_SENSORS, CCLSensor
+
+_LOGGER = logging.getLogger(__name__)
+
+SNAPSHOT_MAGIC = b"CCLS"
+SNAPSHOT_VERSION = 1
+
+
+# Restored state of one device: info values, last update time and
+# [key, value, last update time] per sensor, on this process's monotonic clock.
+CCLDeviceState = list
+
+
+def capture_snapshot(
+    devices: dict[str, CCLDevice], pending: dict[str, CCLDeviceState] | None = None
+) -> dict[str, Any]:
+    """Collect the state of all devices and of restored states not yet claimed.
+
+    Timestamps are stored as ages so they can be rebased onto the
+    monotonic clock of the next process.
+    """
+    now = time.monotonic()
+
+    def age(timestamp: float | None) -> float | None:
+        return None if timestamp is None else now - timestamp
+
+    entries = []
+    # pylint: disable=protected-access
+    for device in devices.values():
+        entries.append(
+            [
+                device.passkey,
+                [device._info[key] for key in CCL_DEVICE_INFO_TYPES],
+                age(device._info["last_update_time"]),
+                [
+                    [key, sensor._value, age(sensor.last_update_time)]
+                    for key, sensor in device._sensors.items()
+                ],
+            ]
+        )
+    for passkey, (info, last_update_time, sensors) in (pending or {}).items():
+        if passkey not in devices:
+            entries.append(
+                [
+                    passkey,
+                    info,
+                    age(last_update_time),
+                    [[key, value, age(timestamp)] for key, value, timestamp in sensors],
+                ]
+            )
+    return {"time": time.time(), "devices": entries}
+
+
+def write_snapshot(snapshot: dict[str, Any], path: str | Path) -> None:
+    """Write a snapshot to disk atomically."""
+    data = zlib.compress(json.dumps(snapshot, separators=(",", ":")).encode(), 1)
+    path = Path(path)
+    descriptor, temp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.")
+    try:
+        with os.fdopen(descriptor, "wb") as file:
+            file.write(SNAPSHOT_MAGIC + bytes((SNAPSHOT_VERSION,)) + data)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+def read_snapshot(path: str | Path) -> dict[str, Any] | None:
+    """Read a snapshot from disk, or None if it is missing or unusable."""
+    try:
+        with open(path, "rb") as file:
+            data = file.read()
+        if data[:4] != SNAPSHOT_MAGIC or data[4:5] != bytes((SNAPSHOT_VERSION,)):
+            raise ValueError("Unknown snapshot format")
+        snapshot = json.loads(zlib.decompress(data[5:]))
+        validate_snapshot(snapshot)
+        return snapshot
+    except FileNotFoundError:
+        return None
+    except Exception as err:  # pylint: disable=broad-exception-caught
+        _LOGGER.warning("Failed to read snapshot %s: %s", path, err)
+        return None
+
+
+def validate_snapshot(snapshot: Any) -> None:
+    """Raise ValueError unless a decoded snapshot has the expected shape."""
+
+    def is_age(value: Any) -> bool:
+        return value is None or (isinstance(value, (int, float)) and not isinstance(value, bool))
+
+    if not isinstance(snapshot, dict) or snapshot.get("time") is None or not is_age(snapshot["time"]):
+        raise ValueError("Invalid snapshot time")
+    if not isinstance(snapshot.get("devices"), list):
+        raise ValueError("Invalid snapshot devices")
+    for entry in snapshot["devices"]:
+        if not (
+            isinstance(entry, list)
+            and len(entry) == 4
+            and isinstance(entry[0], str)
+            and isinstance(entry[1], list)
+            and len(entry[1]) == len(CCL_DEVICE_INFO_TYPES)
+            and all(value is None or isinstance(value, str) for value in entry[1])
+            and is_age(entry[2])
+            and isinstance(entry[3], list)
+        ):
+            raise ValueError("Invalid snapshot device entry")
+        for sensor in entry[3]:
+            if not (
+                isinstance(sensor, list)
+                and len(sensor) == 3
+                and isinstance(sensor[0], str)
+                and is_age(sensor[2])
+            ):
+                raise ValueError("Invalid snapshot sensor entry")
+
+
+def apply_snapshot(devices: dict[str, CCLDevice], snapshot: dict[str, Any]) -> dict[str, CCLDeviceState]:
+    """Restore state into registered devices.
+
+    Returns the states of passkeys that are not registered, keyed by
+    passkey, so they can be merged when those devices are registered.
+    """
+    now = time.monotonic()
+    # Time that passed between writing the snapshot and now.
+    downtime = max(time.time() - snapshot["time"], 0.0)
+
+    def rebase(age: float | None) -> float | None:
+        return None if age is None else now - age - downtime
+
+    pending: dict[str, CCLDeviceState] = {}
+    for passkey, info, age, sensors in snapshot["devices"]:
+        state = [
+            info,
+            rebase(age),
+            [[key, value, rebase(sensor_age)] for key, value, sensor_age in sensors],
+        ]
+        if passkey in devices:
+            restore_state(devices[passkey], state)
+        else:
+            pending[passkey] = state
+    return pending
+
+
+def restore_state(device: CCLDevice, state: CCLDeviceState) -> None:
+    """Merge a restored state into a device without overwriting newer data.
+
+    Restored sensors are queued as new sensors so they are published with
+    the next update.
+    """
+    info, last_update_time, sensors = state
+    # pylint: disable=protected-access
+    if device._set_info(
+        {key: value for key, value in zip(CCL_DEVICE_INFO_TYPES, info) if value is not None}
+    ) and device._info_callback is not None:
+        device._info_callback(device)
+    if last_update_time is not None and device._info["last_update_time"] is None:
+        device._info["last_update_time"] = last_update_time
+    for key, value, timestamp in sensors:
+        if key not in CCL_SENSORS or key in device._sensors:
+            continue
+        sensor = device._sensors[key] = CCLSensor(key)
+        sensor.value = value
+        sensor.last_update_time = timestamp
+        device._new_sensors.append(sensor)
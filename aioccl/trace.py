@@ -0,0 +1,152 @@
+"""Request tracing for the CCL API server."""
+
+from __future__ import annotations
+
+from collections import deque
+import hashlib
+import logging
+import time
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class CCLTrace:
+    """Timings of the stages of one request."""
+
+    __slots__ = ("device_id", "key", "sampled", "status", "start_time_ns", "_marks")
+
+    def __init__(self, passkey: str, sampled: bool):
+        """Start a trace.
+
+        The passkey is a credential, so only a truncated hash of it is kept.
+        """
+        self.device_id: str | None = None
+        self.key = hashlib.sha256(passkey.encode()).hexdigest()[:12]
+        self.sampled = sampled
+        self.status: int | None = None
+        self.start_time_ns = time.time_ns()
+        self._marks: list[tuple[str, int]] = [("", time.perf_counter_ns())]
+
+    def mark(self, stage: str) -> None:
+        """End the current stage and start the next one."""
+        self._marks.append((stage, time.perf_counter_ns()))
+
+    @property
+    def spans(self) -> list[tuple[str, int, int]]:
+        """Return (stage, start, end) in nanoseconds since the trace started."""
+        origin = self._marks[0][1]
+        return [
+            (stage, previous - origin, current - origin)
+            for (_, previous), (stage, current) in zip(self._marks, self._marks[1:])
+        ]
+
+    @property
+    def duration_ns(self) -> int:
+        """Return the time from start to the last mark in nanoseconds."""
+        return self._marks[-1][1] - self._marks[0][1]
+
+
+class CCLTraceSink:
+    """Base class for a destination of finished traces."""
+
+    def emit(self, trace: CCLTrace) -> None:
+        """Receive a finished trace."""
+
+
+class CCLRingSink(CCLTraceSink):
+    """Keep the most recent traces in memory."""
+
+    def __init__(self, size: int = 1000):
+        """Initialize the ring."""
+        self._traces: deque[CCLTrace] = deque(maxlen=size)
+
+    @property
+    def traces(self) -> list[CCLTrace]:
+        """Return the stored traces, oldest first."""
+        return list(self._traces)
+
+    def emit(self, trace: CCLTrace) -> None:
+        """Store a trace, dropping the oldest one when full."""
+        self._traces.append(trace)
+
+
+class CCLLoggingSink(CCLTraceSink):
+    """Write traces to a logger."""
+
+    def __init__(self, logger: logging.Logger = _LOGGER, level: int = logging.DEBUG):
+        """Initialize the sink."""
+        self._logger = logger
+        self._level = level
+
+    def emit(self, trace: CCLTrace) -> None:
+        """Log the stage breakdown of a trace."""
+        self._logger.log(
+            self._level,
+            "Request %s took %.3f ms: %s",
+            trace.device_id or trace.key,
+            trace.duration_ns / 1e6,
+            ", ".join(f"{stage}={(end - start) / 1e6:.3f}" for stage, start, end in trace.spans),
+        )
+
+
+class CCLOpenTelemetrySink(CCLTraceSink):
+    """Export traces as OpenTelemetry spans.
+
+    Requires the opentelemetry-api package.
+    """
+
+    def __init__(self, tracer=None):
+        """Initialize the sink with an OpenTelemetry tracer."""
+        from opentelemetry import trace  # pylint: disable=import-outside-toplevel
+
+        self._otel = trace
+        self._tracer = tracer if tracer is not None else trace.get_tracer(__name__)
+
+    def emit(self, trace: CCLTrace) -> None:
+        """Emit a request span with one child span per stage."""
+        origin = trace.start_time_ns
+        parent = self._tracer.start_span(
+            "ccl.request",
+            start_time=origin,
+            attributes={
+                "ccl.device_id": trace.device_id or "",
+                "ccl.key": trace.key,
+                "http.status_code": trace.status or 0,
+            },
+        )
+        context = self._otel.set_span_in_context(parent)
+        for stage, start, end in trace.spans:
+            self._tracer.start_span(
+                f"ccl.{stage}", context=context, start_time=origin + start
+            ).end(end_time=origin + end)
+        parent.end(end_time=origin + trace.duration_ns)
+
+
+class CCLTracer:
+    """Decide which requests to trace and hand them to a sink."""
+
+    def __init__(self, sink: CCLTraceSink, sample_rate: int = 1, slow_threshold: float | None = None):
+        """Trace 1 in sample_rate requests, plus any slower than slow_threshold seconds."""
+        self._sink = sink
+        self._sample_rate = max(sample_rate, 1)
+        self._slow_threshold_ns = None if slow_threshold is None else int(slow_threshold * 1e9)
+        self._count = 0
+
+    def start(self, passkey: str) -> CCLTrace | None:
+        """Return a trace for this request, or None if it is not traced."""
+        self._count += 1
+        sampled = self._count % self._sample_rate == 0
+        if not sampled and self._slow_threshold_ns is None:
+            return None
+        return CCLTrace(passkey, sampled)
+
+    def finish(self, trace: CCLTrace, status: int) -> None:
+        """Send the trace to the sink if sampled or slow."""
+        trace.status = status
+        if trace.sampled or (
+            self._slow_threshold_ns is not None and trace.duration_ns > self._slow_threshold_ns
+        ):
+            try:
+                self._sink.emit(trace)
+            except Exception as err:  # pylint: disable=broad-exception-caught
+                _LOGGER.warning("Error while emitting trace: %s", err)
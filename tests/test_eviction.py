@@ -0,0 +1,120 @@
+"""Tests for device eviction, spilling and restore."""
+
+import asyncio
+from http import HTTPStatus
+from pathlib import Path
+import tempfile
+import unittest
+from unittest import mock
+
+from aiohttp import streams
+from aiohttp.test_utils import make_mocked_request
+
+from aioccl import CCLDevice, CCLServer
+from aioccl.registry import CCLDeviceIndex, select_idle, select_overflow
+
+
+def passkey(number: int) -> str:
+    """Return a distinct passkey."""
+    return f"{number:064d}"
+
+
+def make_device(number: int, age: float | None) -> CCLDevice:
+    """Build a device that reported age seconds ago, or never if age is None."""
+    device = CCLDevice(passkey(number))
+    device.set_update_callback(lambda sensors: None)
+    if age is not None:
+        device.update_info({"mac_address": f"AA:BB:CC:DD:EE:{number:02X}"})
+        device._info["last_update_time"] -= age  # pylint: disable=protected-access
+    return device
+
+
+def make_request(number: int, body: bytes, content_type: str = "application/json"):
+    """Build a request for a device."""
+    protocol = mock.Mock(_reading_paused=False)
+    payload = streams.StreamReader(protocol, 2**16, loop=asyncio.get_running_loop())
+    payload.feed_data(body)
+    payload.feed_eof()
+    headers = {"Content-Type": content_type, "Content-Length": str(len(body))}
+    return make_mocked_request("GET", "/" + passkey(number), headers=headers, payload=payload)
+
+
+class SelectTest(unittest.TestCase):
+    """Behaviour of the eviction selectors."""
+
+    def setUp(self):
+        self.devices = {
+            passkey(number): make_device(number, age)
+            for number, age in enumerate((None, 500, 100, 10, None))
+        }
+
+    def test_idle_skips_never_reported(self):
+        self.assertEqual(select_idle(self.devices, 50), [passkey(1), passkey(2)])
+
+    def test_overflow_takes_least_recent_first(self):
+        self.assertEqual(select_overflow(self.devices, 3), [passkey(1), passkey(2)])
+
+    def test_overflow_skips_never_reported(self):
+        self.assertEqual(select_overflow(self.devices, 0), [passkey(1), passkey(2), passkey(3)])
+
+    def test_overflow_under_cap(self):
+        self.assertEqual(select_overflow(self.devices, 5), [])
+
+
+class SpillTest(unittest.IsolatedAsyncioTestCase):
+    """Behaviour of eviction to the spill and restore on report."""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        CCLServer.devices = {}
+        CCLServer.index = CCLDeviceIndex()
+        CCLServer.enable_spill(Path(self.directory.name) / "spill")
+        CCLServer.max_idle_time = 300
+        self.restored = []
+        CCLServer.set_restore_callback(self.restored.append)
+        for number, age in enumerate((600, 10)):
+            CCLServer.register(make_device(number, age))
+
+    def tearDown(self):
+        CCLServer.max_idle_time = None
+        CCLServer.set_restore_callback(None)
+        CCLServer.spill.close()
+        CCLServer.spill = None
+        self.directory.cleanup()
+
+    async def test_evict_moves_idle_device_to_spill(self):
+        evicted = CCLServer.evict()
+
+        self.assertEqual([device.passkey for device in evicted], [passkey(0)])
+        self.assertNotIn(passkey(0), CCLServer.devices)
+        self.assertIn(passkey(0), CCLServer.spill)
+        self.assertEqual(CCLServer.find_devices("device_id", "ddee00"), [])
+
+    async def test_valid_request_restores_spilled_device(self):
+        CCLServer.evict()
+        response = await CCLServer.handler(make_request(0, b'{"intem": 20}'))
+
+        self.assertEqual(response.status, HTTPStatus.OK)
+        self.assertEqual(len(self.restored), 1)
+        self.assertEqual(self.restored[0].mac_address, "AA:BB:CC:DD:EE:00")
+        self.assertNotIn(passkey(0), CCLServer.spill)
+
+    async def test_invalid_request_does_not_restore(self):
+        CCLServer.evict()
+        for body, content_type in ((b"", "application/json"), (b"{}", "text/plain"), (b"[1]", "application/json")):
+            response = await CCLServer.handler(make_request(0, body, content_type))
+            self.assertEqual(response.status, HTTPStatus.BAD_REQUEST)
+        self.assertEqual(self.restored, [])
+        self.assertIn(passkey(0), CCLServer.spill)
+
+    async def test_unregister_discards_spilled_device(self):
+        CCLServer.evict()
+        CCLServer.unregister(passkey(0))
+
+        self.assertNotIn(passkey(0), CCLServer.spill)
+        response = await CCLServer.handler(make_request(0, b'{"intem": 20}'))
+        self.assertEqual(response.status, HTTPStatus.NOT_FOUND)
+
+    async def test_unknown_passkey_is_not_found(self):
+        response = await CCLServer.handler(make_request(9, b'{"intem": 20}'))
+        self.assertEqual(response.status, HTTPStatus.NOT_FOUND)
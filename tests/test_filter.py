@@ -0,0 +1,101 @@
+"""Tests for sensor sample filters."""
+
+import unittest
+
+from aioccl import CCLDevice, CCLHampelFilter, CCLRangeFilter, CCLSensorTypes
+from aioccl.exception import CCLSampleRejectedException
+from aioccl.filter import apply_filters
+
+
+class ApplyFiltersTest(unittest.TestCase):
+    """Behaviour of apply_filters."""
+
+    def test_range_rejection(self):
+        filters = [CCLRangeFilter(0, 100)]
+        self.assertEqual(apply_filters(filters, 50), 50)
+        for value in (-1, 101):
+            with self.assertRaises(CCLSampleRejectedException):
+                apply_filters(filters, value)
+
+    def test_string_coercion(self):
+        filters = [CCLRangeFilter(0, 100)]
+        self.assertEqual(apply_filters(filters, "21.5"), 21.5)
+        with self.assertRaises(CCLSampleRejectedException):
+            apply_filters(filters, "150")
+        for value in ("warm", "nan", "inf", True):
+            with self.assertRaises(CCLSampleRejectedException):
+                apply_filters(filters, value)
+
+    def test_unfiltered_values_are_kept(self):
+        self.assertEqual(apply_filters([], "warm"), "warm")
+        self.assertIsNone(apply_filters([CCLRangeFilter(0, 100)], None))
+
+
+class HampelFilterTest(unittest.TestCase):
+    """Behaviour of CCLHampelFilter."""
+
+    def feed(self, sample_filter: CCLHampelFilter, values: list[float]) -> list[bool]:
+        """Return which values were accepted."""
+        accepted = []
+        for value in values:
+            try:
+                sample_filter.apply(value)
+            except CCLSampleRejectedException:
+                accepted.append(False)
+            else:
+                accepted.append(True)
+        return accepted
+
+    def test_scale_floor_on_flat_window(self):
+        self.assertEqual(self.feed(CCLHampelFilter(), [20] * 5 + [22.5, 20]), [True] * 7)
+        self.assertEqual(self.feed(CCLHampelFilter(), [20] * 5 + [23.5]), [True] * 5 + [False])
+        self.assertEqual(
+            self.feed(CCLHampelFilter(min_scale=0.1), [20] * 5 + [20.5]), [True] * 5 + [False]
+        )
+
+    def test_ramp_after_flat_window(self):
+        self.assertEqual(self.feed(CCLHampelFilter(), [20] * 5 + [21, 22, 23, 24, 25]), [True] * 10)
+
+    def test_spike_is_rejected(self):
+        self.assertEqual(self.feed(CCLHampelFilter(), [20] * 5 + [80, 20]), [True] * 5 + [False, True])
+
+    def test_step_is_accepted_once_it_dominates(self):
+        self.assertEqual(
+            self.feed(CCLHampelFilter(), [20] * 5 + [30] * 4), [True] * 5 + [False, False, False, True]
+        )
+
+
+class DeviceFilterTest(unittest.TestCase):
+    """Behaviour of filters on a device."""
+
+    def setUp(self):
+        self.device = CCLDevice("a" * 64)
+        self.updates = []
+        self.device.set_update_callback(lambda sensors: self.updates.append(
+            {key: sensor.value for key, sensor in sensors.items()}
+        ))
+
+    def test_rejected_samples_are_counted_and_not_published(self):
+        self.device.process_data({"intem": 21.5, "inhum": 40})
+        self.device.process_data({"intem": 150, "inhum": "41"})
+        self.device.process_data({"intem": "hot"})
+
+        self.assertEqual(self.device.rejected_samples, 2)
+        self.assertEqual(self.updates[-1], {"intem": 21.5, "inhum": 41.0})
+        self.assertTrue(all(update["intem"] == 21.5 for update in self.updates))
+
+    def test_rejected_first_sample_creates_no_sensor(self):
+        self.device.process_data({"intem": 150})
+
+        self.assertEqual(self.device.rejected_samples, 1)
+        self.assertEqual(self.updates, [{}])
+
+    def test_custom_and_disabled_filters(self):
+        self.device.set_sensor_filters(CCLSensorTypes.TEMPERATURE, lambda: [CCLRangeFilter(0, 30)])
+        self.device.process_data({"intem": 35})
+        self.assertEqual(self.device.rejected_samples, 1)
+
+        self.device.set_sensor_filters(CCLSensorTypes.TEMPERATURE, None)
+        self.device.process_data({"intem": 150})
+        self.assertEqual(self.device.rejected_samples, 1)
+        self.assertEqual(self.updates[-1], {"intem": 150})
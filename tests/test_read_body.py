@@ -0,0 +1,107 @@
+"""Tests for request body reading and decompression."""
+
+import gzip
+from http import HTTPStatus
+import unittest
+from unittest import mock
+import zlib
+
+from aiohttp import streams
+from aiohttp.test_utils import make_mocked_request
+
+from aioccl.server import read_body
+
+BODY = b'{"intem": 21.5, "inhum": 40}'
+MAX_CONTENT_LENGTH = 4096
+MAX_BODY_SIZE = 1024
+
+
+def make_request(chunks: list[bytes], encoding: str | None = None, chunked: bool = False):
+    """Build a request whose payload arrives in the given chunks."""
+    protocol = mock.Mock(_reading_paused=False)
+    payload = streams.StreamReader(protocol, 2**16, loop=mock.Mock())
+    for chunk in chunks:
+        payload.feed_data(chunk)
+    payload.feed_eof()
+    headers = {"Content-Type": "application/json"}
+    if chunked:
+        headers["Transfer-Encoding"] = "chunked"
+    else:
+        headers["Content-Length"] = str(sum(len(chunk) for chunk in chunks))
+    if encoding is not None:
+        headers["Content-Encoding"] = encoding
+    return make_mocked_request("GET", "/" + "a" * 64, headers=headers, payload=payload)
+
+
+def raw_deflate(data: bytes) -> bytes:
+    """Compress without the zlib header."""
+    compressor = zlib.compressobj(wbits=-zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush()
+
+
+class ReadBodyTest(unittest.IsolatedAsyncioTestCase):
+    """Behaviour of read_body."""
+
+    async def read(self, request) -> bytearray:
+        """Read with the test limits."""
+        return await read_body(request, MAX_CONTENT_LENGTH, MAX_BODY_SIZE)
+
+    async def assert_status(self, request, status: HTTPStatus) -> None:
+        """Check that reading fails with the given status."""
+        with self.assertRaises(ValueError) as context:
+            await self.read(request)
+        self.assertEqual(context.exception.args[0], status)
+
+    async def test_identity(self):
+        self.assertEqual(await self.read(make_request([BODY])), BODY)
+
+    async def test_gzip(self):
+        self.assertEqual(await self.read(make_request([gzip.compress(BODY)], "gzip")), BODY)
+
+    async def test_zlib_deflate(self):
+        self.assertEqual(await self.read(make_request([zlib.compress(BODY)], "deflate")), BODY)
+
+    async def test_raw_deflate(self):
+        self.assertEqual(await self.read(make_request([raw_deflate(BODY)], "deflate")), BODY)
+
+    async def test_bomb_is_too_large(self):
+        bomb = gzip.compress(b" " * 2_000_000)
+        self.assertLessEqual(len(bomb), MAX_CONTENT_LENGTH)
+        request = make_request([bomb], "gzip")
+        await self.assert_status(request, HTTPStatus.REQUEST_ENTITY_TOO_LARGE)
+
+    async def test_decompressed_over_limit_is_too_large(self):
+        data = gzip.compress(b" " * (MAX_BODY_SIZE + 1))
+        await self.assert_status(make_request([data], "gzip"), HTTPStatus.REQUEST_ENTITY_TOO_LARGE)
+
+    async def test_truncated_stream_is_bad_request(self):
+        data = gzip.compress(BODY)[:-10]
+        await self.assert_status(make_request([data], "gzip"), HTTPStatus.BAD_REQUEST)
+
+    async def test_corrupt_stream_is_bad_request(self):
+        await self.assert_status(make_request([b"not gzip"], "gzip"), HTTPStatus.BAD_REQUEST)
+
+    async def test_unknown_encoding(self):
+        await self.assert_status(make_request([BODY], "br"), HTTPStatus.UNSUPPORTED_MEDIA_TYPE)
+
+    async def test_content_length_over_limit(self):
+        request = make_request([b" " * (MAX_CONTENT_LENGTH + 1)])
+        await self.assert_status(request, HTTPStatus.REQUEST_ENTITY_TOO_LARGE)
+
+    async def test_empty_body_is_bad_request(self):
+        await self.assert_status(make_request([]), HTTPStatus.BAD_REQUEST)
+
+    async def test_chunked_identity(self):
+        request = make_request([BODY[:10], BODY[10:]], chunked=True)
+        self.assertEqual(await self.read(request), BODY)
+
+    async def test_chunked_gzip(self):
+        data = gzip.compress(BODY)
+        request = make_request([data[:5], data[5:20], data[20:]], "gzip", chunked=True)
+        self.assertEqual(await self.read(request), BODY)
+
+    async def test_chunked_over_limit(self):
+        chunks = [b" " * 1000] * 5
+        await self.assert_status(
+            make_request(chunks, chunked=True), HTTPStatus.REQUEST_ENTITY_TOO_LARGE
+        )
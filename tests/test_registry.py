@@ -0,0 +1,92 @@
+"""Tests for the device registry and its indexes."""
+
+import json
+from pathlib import Path
+import tempfile
+import unittest
+
+from aioccl import CCLDevice, CCLServer
+from aioccl.registry import CCLDeviceIndex
+
+
+def make_device(number: int, model: str = "C3") -> CCLDevice:
+    """Build a device with distinct identifiers and a shared model."""
+    device = CCLDevice(f"{number:064d}")
+    device._set_info(  # pylint: disable=protected-access
+        {"mac_address": f"AA:BB:CC:DD:EE:{number:02X}", "model": model, "serial_no": f"S{number}"}
+    )
+    return device
+
+
+class IndexTest(unittest.TestCase):
+    """Behaviour of CCLDeviceIndex."""
+
+    def setUp(self):
+        self.index = CCLDeviceIndex()
+        self.devices = [make_device(number) for number in range(3)]
+        self.index.add_many(self.devices)
+
+    def test_find_unique_and_shared_values(self):
+        self.assertEqual(self.index.find("serial_no", "S1"), [self.devices[1]])
+        self.assertEqual(self.index.find("device_id", "ddee02"), [self.devices[2]])
+        self.assertEqual(self.index.find("model", "C3"), self.devices)
+        self.assertEqual(self.index.find("model", "C4"), [])
+        with self.assertRaises(KeyError):
+            self.index.find("firmware", "1.0")
+
+    def test_info_update_moves_device(self):
+        self.devices[0].update_info({"model": "C4", "serial_no": "S1"})
+
+        self.assertEqual(self.index.find("model", "C4"), [self.devices[0]])
+        self.assertEqual(self.index.find("model", "C3"), self.devices[1:])
+        self.assertEqual(self.index.find("serial_no", "S0"), [])
+        self.assertEqual(self.index.find("serial_no", "S1"), [self.devices[1], self.devices[0]])
+
+    def test_remove_collapses_shared_values(self):
+        self.devices[1].update_info({"serial_no": "S0"})
+        self.index.remove(self.devices[0])
+
+        self.assertEqual(self.index.find("serial_no", "S0"), [self.devices[1]])
+        self.index.remove(self.devices[1])
+        self.assertEqual(self.index.find("serial_no", "S0"), [])
+        self.assertEqual(self.index.find("model", "C3"), [self.devices[2]])
+
+    def test_removed_device_is_not_followed(self):
+        self.index.remove(self.devices[0])
+        self.devices[0].update_info({"model": "C4"})
+
+        self.assertEqual(self.index.find("model", "C4"), [])
+
+    def test_clear(self):
+        self.index.clear()
+        self.devices[0].update_info({"model": "C4"})
+
+        self.assertEqual(self.index.find("model", "C3"), [])
+        self.assertEqual(self.index.find("model", "C4"), [])
+
+
+class RegisterFileTest(unittest.TestCase):
+    """Behaviour of register_file and unregister_file."""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = Path(self.directory.name) / "devices.json"
+        self.path.write_text(
+            json.dumps(["a" * 64, {"passkey": "b" * 64, "model": "C3", "passkey_hint": "x"}]),
+            encoding="utf-8",
+        )
+        CCLServer.devices = {}
+        CCLServer.index = CCLDeviceIndex()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_round_trip(self):
+        CCLServer.register_file(self.path)
+
+        self.assertEqual(sorted(CCLServer.devices), ["a" * 64, "b" * 64])
+        self.assertEqual([device.passkey for device in CCLServer.find_devices("model", "C3")], ["b" * 64])
+
+        CCLServer.unregister_file(self.path)
+        self.assertEqual(CCLServer.devices, {})
+        self.assertEqual(CCLServer.find_devices("model", "C3"), [])
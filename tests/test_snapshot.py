@@ -0,0 +1,144 @@
+"""Tests for registry snapshots and warm restarts."""
+
+import json
+from pathlib import Path
+import tempfile
+import time
+import unittest
+import zlib
+
+from aioccl import CCLDevice, CCLServer
+from aioccl.exception import CCLDataUpdateException
+from aioccl.registry import CCLDeviceIndex
+from aioccl.snapshot import (
+    SNAPSHOT_MAGIC,
+    SNAPSHOT_VERSION,
+    apply_snapshot,
+    capture_snapshot,
+    read_snapshot,
+    write_snapshot,
+)
+
+PASSKEY = "a" * 64
+
+
+def make_device(passkey: str = PASSKEY, age: float = 0.0) -> CCLDevice:
+    """Build a device that reported age seconds ago."""
+    device = CCLDevice(passkey)
+    device.set_update_callback(lambda sensors: None)
+    device.update_info({"mac_address": "AA:BB:CC:DD:EE:FF", "model": "C3"})
+    device.store_data({"intem": 21.5, "inhum": 40})
+    # pylint: disable=protected-access
+    device._info["last_update_time"] -= age
+    for sensor in device._sensors.values():
+        sensor.last_update_time -= age
+    return device
+
+
+def downtime(snapshot: dict, seconds: float) -> dict:
+    """Pretend the snapshot was written seconds before now."""
+    snapshot["time"] -= seconds
+    return snapshot
+
+
+class SnapshotTest(unittest.IsolatedAsyncioTestCase):
+    """Behaviour of snapshot capture, storage and restore."""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = Path(self.directory.name) / "snapshot.bin"
+        CCLServer.devices = {}
+        CCLServer.index = CCLDeviceIndex()
+        CCLServer._pending_states = {}  # pylint: disable=protected-access
+        CCLServer.snapshot_path = self.path
+
+    def tearDown(self):
+        CCLServer.snapshot_path = None
+        self.directory.cleanup()
+
+    async def test_round_trip(self):
+        write_snapshot(capture_snapshot({PASSKEY: make_device()}), self.path)
+        snapshot = read_snapshot(self.path)
+        device = CCLDevice(PASSKEY)
+
+        self.assertEqual(apply_snapshot({PASSKEY: device}, snapshot), {})
+        self.assertEqual(device.mac_address, "AA:BB:CC:DD:EE:FF")
+        self.assertEqual(device.model, "C3")
+        sensors = device.get_sensors()
+        self.assertEqual(sensors["intem"].value, 21.5)
+        self.assertEqual(sensors["inhum"].value, 40)
+
+    async def test_ages_are_rebased_with_downtime(self):
+        snapshot = downtime(capture_snapshot({PASSKEY: make_device(age=100)}), 200)
+        device = CCLDevice(PASSKEY)
+        apply_snapshot({PASSKEY: device}, snapshot)
+
+        self.assertAlmostEqual(time.monotonic() - device.last_update_time, 300, delta=1)
+        self.assertAlmostEqual(
+            time.monotonic() - device.get_sensors()["intem"].last_update_time, 300, delta=1
+        )
+
+    async def test_device_expired_during_downtime_stays_not_ready(self):
+        snapshot = downtime(capture_snapshot({PASSKEY: make_device(age=100)}), 550)
+        device = CCLDevice(PASSKEY)
+        apply_snapshot({PASSKEY: device}, snapshot)
+
+        with self.assertRaises(CCLDataUpdateException):
+            device.get_sensors()
+
+    async def test_merge_keeps_callbacks_and_announces_sensors(self):
+        snapshot = capture_snapshot({PASSKEY: make_device()})
+        device = CCLDevice(PASSKEY)
+        updates = []
+        new_sensors = []
+        device.set_update_callback(updates.append)
+        device.set_new_sensor_callback(lambda sensors: new_sensors.extend(sensors) or True)
+        apply_snapshot({PASSKEY: device}, snapshot)
+        device.push_updates()
+
+        self.assertEqual(sorted(sensor.key for sensor in new_sensors), ["inhum", "intem"])
+        self.assertEqual(len(updates), 1)
+
+    async def test_newer_data_is_not_overwritten(self):
+        snapshot = capture_snapshot({PASSKEY: make_device()})
+        device = CCLDevice(PASSKEY)
+        device.set_update_callback(lambda sensors: None)
+        device.process_data({"intem": 25})
+        apply_snapshot({PASSKEY: device}, snapshot)
+
+        self.assertEqual(device.get_sensors()["intem"].value, 25)
+        self.assertEqual(device.get_sensors()["inhum"].value, 40)
+
+    async def test_unregistered_state_waits_for_registration(self):
+        write_snapshot(capture_snapshot({PASSKEY: make_device()}), self.path)
+        CCLServer.load_snapshot()
+        self.assertNotIn(PASSKEY, CCLServer.devices)
+
+        device = CCLDevice(PASSKEY)
+        CCLServer.register(device)
+
+        self.assertEqual(device.get_sensors()["intem"].value, 21.5)
+        self.assertEqual(CCLServer.find_devices("model", "C3"), [device])
+
+    async def test_pending_state_survives_another_save(self):
+        write_snapshot(capture_snapshot({PASSKEY: make_device()}), self.path)
+        CCLServer.load_snapshot()
+        await CCLServer.save_snapshot()
+        CCLServer._pending_states = {}  # pylint: disable=protected-access
+        CCLServer.load_snapshot()
+
+        device = CCLDevice(PASSKEY)
+        CCLServer.register(device)
+        self.assertEqual(device.get_sensors()["inhum"].value, 40)
+
+    async def test_malformed_snapshot_is_ignored(self):
+        data = zlib.compress(json.dumps({"devices": [[1, 2]]}).encode())
+        self.path.write_bytes(SNAPSHOT_MAGIC + bytes((SNAPSHOT_VERSION,)) + data)
+
+        with self.assertLogs("aioccl.snapshot", "WARNING"):
+            self.assertIsNone(read_snapshot(self.path))
+            CCLServer.load_snapshot()
+        self.assertEqual(CCLServer.devices, {})
+
+    async def test_missing_snapshot_is_ignored(self):
+        self.assertIsNone(read_snapshot(self.path))